@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
+import asyncio
 import atexit
-import numpy as np
+import collections
 
 from llama.influxdb import aggregate_stats_default
 from llama.rpc import add_chunker_methods, run_simple_rpc_server
@@ -15,10 +16,12 @@ class RPCInterface:
         for c in channels:
             add_chunker_methods(self, c)
 
-    def get_latest_spectrum(self):
+    async def get_latest_spectrum(self):
         """Read the current spectrum and return"""
-        meas = self._lsa.get_analysis_trace()
-        return np.vstack([np.ctypeslib.as_array(x) for x in meas]).T.copy()
+        # The DLL calls and copies release the GIL, so keep them off the event
+        # loop to continue servicing other clients and driver callbacks.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._lsa.get_analysis_trace_array)
 
 
 def setup_interface(args, influx_pusher, loop):
@@ -27,6 +30,9 @@ def setup_interface(args, influx_pusher, loop):
     def reg_chan(name: str, meas_type: MeasurementType) -> None:
         def cb(values):
             if influx_pusher:
+                # The reduction is done inline: for 256-sample bins it is
+                # cheap, and mostly holds the GIL anyway, so offloading it to
+                # an executor would not free up the loop.
                 influx_pusher.push(name, aggregate_stats_default(values))
         channel = ChunkedChannel(name, cb, 256, 30, loop)
         channels[meas_type] = channel
@@ -41,11 +47,30 @@ def setup_interface(args, influx_pusher, loop):
     lsa = LSA()
     atexit.register(lsa.close)
 
-    # Bridge from the driver thread to the main thread.
+    # Bridge from the driver thread to the main thread. Measurements are
+    # queued up and handed over in batches, so that only one loop wakeup is
+    # needed per batch rather than one per measurement. deque.append() and
+    # popleft() are atomic, so no further locking is required.
+    pending = collections.deque()
+    drain_scheduled = False
+
+    def drain():
+        nonlocal drain_scheduled
+        # Clear the flag before draining, so that a measurement appended
+        # concurrently either gets picked up below or schedules a new drain.
+        drain_scheduled = False
+        while pending:
+            meas_type, meas_value = pending.popleft()
+            if meas_type in channels:
+                channels[meas_type].push(meas_value)
+
     def meas_cb(meas_type, meas_value):
-        if meas_type in channels:
-            channels[meas_type].push(float(meas_value))
-    lsa.add_callback(lambda *a: loop.call_soon_threadsafe(lambda: meas_cb(*a)))
+        nonlocal drain_scheduled
+        pending.append((meas_type, meas_value))
+        if not drain_scheduled:
+            drain_scheduled = True
+            loop.call_soon_threadsafe(drain)
+    lsa.add_callback(meas_cb)
 
     return RPCInterface(lsa, channels.values())
 
@@ -6,6 +6,7 @@ analyser.
 """
 
 import logging
+import numpy as np
 
 from .wlm_data_constants import *
 from ctypes import CFUNCTYPE, c_double, c_long, c_ssize_t, POINTER, windll
@@ -20,31 +21,33 @@ class WlmDataException(Exception):
     pass
 
 
+# Error messages as per the PDF documentation. The meaning of most of the
+# other constants could probably be inferred from their name. Stored as
+# (flag, message) pairs, as they are only ever walked in order.
+_CONTROL_WLM_ERROR_MESSAGES = (
+    (flErrDeviceNotFound, "no LSA device found"),
+    (flErrDriverError, "the driver was not loaded correctly or caused the "
+                       "device to not start properly"),
+    (flErrUSBError, "a USB error occurred and the device could not be "
+                    "started properly"),
+    (flErrUnknownDeviceError, "an unknown device error occurred and the "
+                              "device could not be started properly"),
+    (flErrWrongSN, "the device started has an unexpected serial number"),
+    (flErrUnknownSN, "the device started has an unknown serial number"),
+    (flErrTemperatureError, "an error occurred on initialisation of the "
+                            "temperature sensor (wavelength measurements "
+                            "will be incorrect)"),
+    (flErrCancelledManually, "device initialisation was cancelled manually")
+)
+
+
 def _check_control_wlm_error(code: c_long):
     if (code & ~flServerStarted) == 0:
         # No error.
         return code
 
-    # Error messages as per the PDF documentation. The meaning of most of the
-    # other constants could probably be inferred from their name.
-    messages = {
-        flErrDeviceNotFound: "no LSA device found",
-        flErrDriverError: "the driver was not loaded correctly or caused the "
-                          "device to not start properly",
-        flErrUSBError: "a USB error occurred and the device could not be "
-                       "started properly",
-        flErrUnknownDeviceError: "an unknown device error occurred and the "
-                                 "device could not be started properly",
-        flErrWrongSN: "the device started has an unexpected serial number",
-        flErrUnknownSN: "the device started has an unknown serial number",
-        flErrTemperatureError: "an error occurred on initialisation of the "
-                               "temperature sensor (wavelength measurements "
-                               "will be incorrect)",
-        flErrCancelledManually: "device initialisation was cancelled manually"
-    }
-
     msg = ""
-    for flag, flag_msg in messages.items():
+    for flag, flag_msg in _CONTROL_WLM_ERROR_MESSAGES:
         if flag & code:
             if msg:
                 msg += ", "
@@ -65,6 +68,31 @@ def _check_get_wlm_version_error(code: c_long):
     raise WlmDataException("Unknown error in GetWLMVersion.")
 
 
+_SET_ERROR_MESSAGES = {
+    ResERR_WlmMissing: "No matching LSA server instance active.",
+    ResERR_CouldNotSet: "Value could not be set due to an internal error.",
+    ResERR_ParmOutOfRange: "Value to be set exceeds the allowed range.",
+    ResERR_WlmOutOfResources: "LSA server out of memory or resources.",
+    ResERR_WlmInternalError: "LSA server internal error.",
+    ResERR_NotAvailable: "Parameter not available in this LSA version.",
+    ResERR_WlmBusy: "The LSA server was busy.",
+    ResERR_NotInMeasurementMode: "Function call not allowed in "
+                                 "measurement mode.",
+    ResERR_OnlyInMeasurementMode: "Function call only allowed in "
+                                  "measurement mode.",
+    ResERR_ChannelNotAvailable: "Channel index out of range.",
+    ResERR_ChannelTemporarilyNotAvailable: "The given channel temporarily isn't"
+                                           "available (not in switch mode?).",
+    ResERR_CalOptionNotAvailable: "Given calibration option not supported "
+                                  "by this LSA.",
+    ResERR_CalWavelengthOutOfRange: "Calibration wavelength outside the "
+                                    "allowed range.",
+    ResERR_BadCalibrationSignal: "Calibration signal is of bad quality "
+                                 "(does not match given wavelength?).",
+    ResERR_UnitNotAvailable: "Result unit not available."  # It's a mystery.
+}
+
+
 def _check_set_error(code: c_long):
     """Checks the return value of the Set* family of functions, throwing an
     exception if it indicates an error."""
@@ -72,31 +100,7 @@ def _check_set_error(code: c_long):
     if code == ResERR_NoErr:
         return
 
-    messages = {
-        ResERR_WlmMissing: "No matching LSA server instance active.",
-        ResERR_CouldNotSet: "Value could not be set due to an internal error.",
-        ResERR_ParmOutOfRange: "Value to be set exceeds the allowed range.",
-        ResERR_WlmOutOfResources: "LSA server out of memory or resources.",
-        ResERR_WlmInternalError: "LSA server internal error.",
-        ResERR_NotAvailable: "Parameter not available in this LSA version.",
-        ResERR_WlmBusy: "The LSA server was busy.",
-        ResERR_NotInMeasurementMode: "Function call not allowed in "
-                                     "measurement mode.",
-        ResERR_OnlyInMeasurementMode: "Function call only allowed in "
-                                      "measurement mode.",
-        ResERR_ChannelNotAvailable: "Channel index out of range.",
-        ResERR_ChannelTemporarilyNotAvailable: "The given channel temporarily isn't"
-                                               "available (not in switch mode?).",
-        ResERR_CalOptionNotAvailable: "Given calibration option not supported "
-                                      "by this LSA.",
-        ResERR_CalWavelengthOutOfRange: "Calibration wavelength outside the "
-                                        "allowed range.",
-        ResERR_BadCalibrationSignal: "Calibration signal is of bad quality "
-                                     "(does not match given wavelength?).",
-        ResERR_UnitNotAvailable: "Result unit not available."  # It's a mystery.
-    }
-
-    msg = messages.get(code, None)
+    msg = _SET_ERROR_MESSAGES.get(code, None)
     if not msg:
         msg = "Unknown error occurred (code: {}).".format(code)
     raise WlmDataException(msg)
@@ -185,6 +189,14 @@ def is_double_measurement(meas_type: MeasurementType):
     return meas_type in _DOUBLE_MEASUREMENT_TYPES
 
 
+#: Maps callback mode values to (measurement type, is double) tuples, to avoid
+#: going through the enum constructor (and is_double_measurement()) for every
+#: callback invocation.
+_MEASUREMENT_TYPE_BY_MODE = {
+    mt.value: (mt, is_double_measurement(mt)) for mt in MeasurementType
+}
+
+
 class LSA:
     _log = logging.getLogger("highfinesse_lsa.LSA")
 
@@ -198,13 +210,25 @@ class LSA:
             been initialised successfully by then. Note that the server takes
             several seconds to initialise the device on startup.
         """
-        self._result_callbacks = []
+        # Replaced (never mutated) under the lock, so the driver thread can
+        # iterate over a consistent snapshot without taking the lock.
+        self._result_callbacks = ()
         self._result_callbacks_lock = threading.Lock()
 
         # We get notified when auto-calibration starts and end, so we can ignore
         # callback events in between.
         self._calibration_active = False
 
+        # Backing storage for the analysis trace, reused between readouts and
+        # grown to the largest length seen so far. Start out with empty arrays
+        # rather than None so that zero-length traces can be viewed into them
+        # as well. Guarded by _trace_lock, which must be held for as long as
+        # views into the buffers are in use.
+        self._trace_lock = threading.Lock()
+        self._trace_capacity = 0
+        self._wavelength_buf = (c_double * 0)()
+        self._amplitude_buf = (c_double * 0)()
+
         self._driver = Driver()
 
         is_running = self._driver.instantiate(c_long(cInstCheckForWLM),
@@ -235,7 +259,7 @@ class LSA:
         # seems logical that we need to keep the callback object itself alive
         # for as long as it is used from C code, not the CFUNCTYPE return value.
         callback_type = CFUNCTYPE(None, c_long, c_long, c_long, c_double, c_long)
-        self._c_callback = callback_type(lambda *args: self._callback_ex(*args))
+        self._c_callback = callback_type(self._callback_ex)
         self._driver.instantiate(c_long(cInstNotification),
                                  c_long(cNotifyInstallCallbackEx),
                                  self._c_callback,
@@ -271,26 +295,56 @@ class LSA:
         This function is thread-safe.
         """
         with self._result_callbacks_lock:
-            self._result_callbacks.append(cb)
+            self._result_callbacks = self._result_callbacks + (cb,)
 
     def remove_callback(self, cb: Callable[[MeasurementType,
                                             Union[int, float]], None]) -> None:
         """Unregister a previously added measurement result callback.
 
-        This function is thread-safe.
+        This function is thread-safe. Note that cb may still be invoked once
+        more by a dispatch already in progress on the driver thread.
         """
         with self._result_callbacks_lock:
-            self._result_callbacks.remove(cb)
+            callbacks = list(self._result_callbacks)
+            callbacks.remove(cb)
+            self._result_callbacks = tuple(callbacks)
 
     def get_analysis_trace(self):
         """Retrieve the latest analysis "pattern" (trace) from the server
         application.
 
+        This function is thread-safe.
+
         :return: A tuple (wavelengths, amplitudes) of two ctypes arrays of
             c_doubles, representing the x- and y-axes of the LSA analysis graph
             (amplitude per wavelength on the CCD).
         """
+        with self._trace_lock:
+            wavelengths, amplitudes = self._read_analysis_trace()
+            return (type(wavelengths).from_buffer_copy(wavelengths),
+                    type(amplitudes).from_buffer_copy(amplitudes))
+
+    def get_analysis_trace_array(self) -> np.ndarray:
+        """Retrieve the latest analysis trace from the server application as a
+        single NumPy array, avoiding the intermediate copies of
+        :meth:`get_analysis_trace`.
+
+        This function is thread-safe.
 
+        :return: An array of shape (n, 2), with the wavelengths in the first
+            and the respective amplitudes in the second column.
+        """
+        with self._trace_lock:
+            wavelengths, amplitudes = self._read_analysis_trace()
+            result = np.empty((len(wavelengths), 2), dtype=np.float64)
+            result[:, 0] = np.frombuffer(wavelengths, dtype=np.float64)
+            result[:, 1] = np.frombuffer(amplitudes, dtype=np.float64)
+        return result
+
+    def _read_analysis_trace(self):
+        """Read the latest analysis trace into the internal buffers, returning
+        ctypes views of the trace length into them. Must be called with
+        _trace_lock held."""
         length = self._driver.get_analysis_item_count(cSignalAnalysis)
         if length < 0:
             raise WlmDataException("Analysis trace data not ready.")
@@ -300,10 +354,15 @@ class LSA:
             raise WlmDataException("Unexpected data type in analysis data "
                                    "(expected double, got size: {}).".format(elem_size))
 
-        wavelengths = (c_double * length)()
+        if length > self._trace_capacity:
+            self._wavelength_buf = (c_double * length)()
+            self._amplitude_buf = (c_double * length)()
+            self._trace_capacity = length
+
+        wavelengths = (c_double * length).from_buffer(self._wavelength_buf)
         self._driver.get_analysis_data(cSignalAnalysisX, wavelengths)
 
-        amplitudes = (c_double * length)()
+        amplitudes = (c_double * length).from_buffer(self._amplitude_buf)
         self._driver.get_analysis_data(cSignalAnalysisY, amplitudes)
 
         return wavelengths, amplitudes
@@ -332,15 +391,16 @@ class LSA:
             self._log.warn("'res1' callback parameter should always be 0, "
                            "not %s; entered switching mode?", res1)
 
-        try:
-            meas_type = MeasurementType(mode)
-        except ValueError:
+        entry = _MEASUREMENT_TYPE_BY_MODE.get(mode)
+        if entry is None:
             # Not an event we are interested in.
             return
+        meas_type, is_double = entry
 
         # TODO: Handle special values indicating failure (probably just drop
         # those points).
-        meas_value = dblval if is_double_measurement(meas_type) else intval
-        with self._result_callbacks_lock:
-            for cb in self._result_callbacks:
-                cb(meas_type, meas_value)
+        # dblval already arrives as a Python float; convert the (rarely
+        # updated) integer values so consumers always see floats.
+        meas_value = dblval if is_double else float(intval)
+        for cb in self._result_callbacks:
+            cb(meas_type, meas_value)